@@ -4,7 +4,7 @@ import json
 import sys
 import threading
 import queue
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
 import pygame
 import websockets
@@ -17,6 +17,9 @@ WIDTH, HEIGHT = 800, 1000
 BOARD_ROWS, BOARD_COLS = 3, 3
 FPS = 60
 
+# binary move frame opcode (see Protocol.md): b"\x01" + row + col
+OP_MOVE = 0x01
+
 # Layout
 BOARD_H = int(HEIGHT * 0.66)
 CELL_W = WIDTH // BOARD_COLS
@@ -45,11 +48,42 @@ font_big = pygame.font.SysFont("Arial", 120)
 font = pygame.font.SysFont("Arial", 24)
 font_small = pygame.font.SysFont("Arial", 18)
 
+# font.render is the most expensive per-frame CPU op; cache rendered surfaces
+# keyed by (font, text, color) so repeated frames reuse them
+_glyph_cache: dict = {}
+
+def glyph(fnt, s: str, color):
+    key = (id(fnt), s, color)
+    surf = _glyph_cache.get(key)
+    if surf is None:
+        if len(_glyph_cache) > 512:  # chat/typing strings churn; keep it bounded
+            _glyph_cache.clear()
+        surf = _glyph_cache[key] = fnt.render(s, True, color)
+    return surf
+
 # Networking mailboxes
 inbox: "queue.Queue[dict]" = queue.Queue()
-outbox: "queue.Queue[dict]" = queue.Queue()
 stop_flag = threading.Event()
 
+# Outbound messages go straight into an asyncio.Queue on the network thread's
+# loop (via call_soon_threadsafe) so the sender awaits instead of polling.
+ws_loop_ref: Optional[asyncio.AbstractEventLoop] = None
+outbox: Optional["asyncio.Queue[Union[dict, bytes]]"] = None
+pending_out: List[Union[dict, bytes]] = []  # posted before the connection is up
+
+def post(obj: Union[dict, bytes]):
+    """Queue an outbound message (dict, or pre-encoded binary frame)."""
+    if ws_loop_ref is not None and outbox is not None and not ws_loop_ref.is_closed():
+        try:
+            ws_loop_ref.call_soon_threadsafe(outbox.put_nowait, obj)
+        except RuntimeError:
+            # the loop closed between the check and the call (connection
+            # died); re-buffer like pre-connection messages instead of
+            # letting a click crash the UI thread
+            pending_out.append(obj)
+    else:
+        pending_out.append(obj)
+
 # Client state
 role: Optional[str] = None            # "X" | "O" | "spectator"
 name_me: str = ""                     # my display name (if server echoes it in state)
@@ -64,20 +98,45 @@ connected = False
 disconnect_reason = ""
 restart_offer_from: Optional[str] = None  # "X" or "O" when the other asks to restart
 
+# Redraw only when something visible changed; at idle the loop just ticks.
+# Changes are tracked as dirty rects so a small change (timer text, one board
+# cell) uploads just that region via display.update instead of a full flip.
+FULL_RECT = pygame.Rect(0, 0, WIDTH, HEIGHT)
+STATUS_RECT = pygame.Rect(0, 0, WIDTH, 70)
+TIMER_RECT = pygame.Rect(WIDTH - 220, 30, 220, 40)
+PANEL_RECT = pygame.Rect(0, BOARD_H, WIDTH, HEIGHT - BOARD_H)
+dirty_rects: List[pygame.Rect] = [FULL_RECT]
+
+def mark_dirty(rect: Optional[pygame.Rect] = None):
+    dirty_rects.append(rect or FULL_RECT)
+
+def cell_rect(r: int, c: int) -> pygame.Rect:
+    return pygame.Rect(c * CELL_W, r * CELL_H, CELL_W, CELL_H)
+
 # Chat
 chat_lines: List[Tuple[str, str]] = []  # (name, msg)
 chat_input_active = False
 chat_text = ""
+# composed chat log surface; rebuilt only when chat_lines changes
+_chat_surface: Optional[pygame.Surface] = None
+_chat_log_dirty = True
 
 # Buttons (rects computed later)
 restart_btn = pygame.Rect(MARGIN, PANEL_Y, BTN_W, BTN_H)
 resign_btn = pygame.Rect(MARGIN + BTN_W + 10, PANEL_Y, BTN_W, BTN_H)
 # Chat input box
 chat_box = pygame.Rect(MARGIN, PANEL_Y + BTN_H + 12, WIDTH - MARGIN * 2, 34)
+# input box plus the log lines below it
+CHAT_RECT = pygame.Rect(0, chat_box.y, WIDTH, HEIGHT - chat_box.y)
 
 # ---------- WebSocket tasks ----------
-async def ws_loop(uri: str, inbox: queue.Queue, outbox: queue.Queue, stop_flag: threading.Event):
-    global connected
+async def ws_loop(uri: str, inbox: queue.Queue, stop_flag: threading.Event):
+    global connected, ws_loop_ref, outbox
+    ws_loop_ref = asyncio.get_running_loop()
+    outbox = asyncio.Queue()
+    for obj in pending_out:
+        outbox.put_nowait(obj)
+    pending_out.clear()
     try:
         async with websockets.connect(uri, max_size=2**20) as ws:
             connected = True
@@ -87,13 +146,24 @@ async def ws_loop(uri: str, inbox: queue.Queue, outbox: queue.Queue, stop_flag:
 
             async def sender():
                 while not stop_flag.is_set():
+                    # coalesce everything queued since the last wakeup into
+                    # one frame; framing overhead dwarfs these tiny payloads
+                    msgs = [await outbox.get()]
+                    while True:
+                        try:
+                            msgs.append(outbox.get_nowait())
+                        except asyncio.QueueEmpty:
+                            break
+                    # binary frames (moves) go out as-is; dicts coalesce
+                    # into one JSON frame
+                    raw = [m for m in msgs if isinstance(m, bytes)]
+                    dicts = [m for m in msgs if isinstance(m, dict)]
                     try:
-                        obj = outbox.get_nowait()
-                    except queue.Empty:
-                        await asyncio.sleep(0.02)
-                        continue
-                    try:
-                        await ws.send(json.dumps(obj))
+                        for frame in raw:
+                            await ws.send(frame)
+                        if dicts:
+                            obj = dicts[0] if len(dicts) == 1 else {"type": "batch", "msgs": dicts}
+                            await ws.send(json.dumps(obj))
                     except Exception:
                         # Connection lost
                         break
@@ -123,7 +193,7 @@ async def ws_loop(uri: str, inbox: queue.Queue, outbox: queue.Queue, stop_flag:
         inbox.put({"type": "_reader_done"})
 
 def start_ws_thread():
-    t = threading.Thread(target=lambda: asyncio.run(ws_loop(URI, inbox, outbox, stop_flag)), daemon=True)
+    t = threading.Thread(target=lambda: asyncio.run(ws_loop(URI, inbox, stop_flag)), daemon=True)
     t.start()
     return t
 
@@ -137,12 +207,12 @@ def draw_status_bar():
     role_str = f"You: {role or '-'}"
     role_color = BLUE if role in ("X", "O") else GREY
     pygame.draw.rect(screen, role_color, (left, 8, 120, 28), border_radius=8)
-    txt = font_small.render(role_str, True, WHITE)
+    txt = glyph(font_small, role_str, WHITE)
     screen.blit(txt, (left + 8, 12))
 
     # names & scores center
     center_text = f"{names.get('X','X')} (X) {scores.get('X',0)}  —  {scores.get('O',0)} (O) {names.get('O','O')}"
-    ct = font.render(center_text, True, BLACK)
+    ct = glyph(font, center_text, BLACK)
     screen.blit(ct, (WIDTH//2 - ct.get_width()//2, 10))
 
     # turn / winner right
@@ -151,7 +221,7 @@ def draw_status_bar():
         status = "Draw!" if winner == "draw" else f"{winner} wins!"
     elif turn:
         status = f"Turn: {turn}"
-    rt = font.render(status, True, BLACK)
+    rt = glyph(font, status, BLACK)
     screen.blit(rt, (right - rt.get_width(), 10))
 
     # timer
@@ -159,7 +229,7 @@ def draw_status_bar():
         import time as _t
         ms_left = max(0, turn_deadline_ms - int(_t.time() * 1000))
         sec = (ms_left + 999)//1000
-        tt = font_small.render(f"Timer: {sec}s", True, (120, 0, 0))
+        tt = glyph(font_small, f"Timer: {sec}s", (120, 0, 0))
         screen.blit(tt, (right - tt.get_width(), 40))
 
 def draw_board():
@@ -171,44 +241,52 @@ def draw_board():
             pygame.draw.rect(screen, BLACK, rect, width=2)
             val = board[r][c]
             if val:
-                label = font_big.render(val, True, BLACK)
+                label = glyph(font_big, val, BLACK)
                 lr = label.get_rect(center=rect.center)
                 screen.blit(label, lr)
 
 def draw_buttons():
     # Restart
     pygame.draw.rect(screen, GREEN, restart_btn, border_radius=8)
-    rt = font.render("Restart", True, WHITE)
+    rt = glyph(font, "Restart", WHITE)
     screen.blit(rt, (restart_btn.centerx - rt.get_width()//2, restart_btn.centery - rt.get_height()//2))
 
     # Resign (disabled for spectators)
     color = RED if role in ("X","O") else GREY
     pygame.draw.rect(screen, color, resign_btn, border_radius=8)
-    tt = font.render("Resign", True, WHITE)
+    tt = glyph(font, "Resign", WHITE)
     screen.blit(tt, (resign_btn.centerx - tt.get_width()//2, resign_btn.centery - tt.get_height()//2))
 
     # Restart offer banner, if any
     if restart_offer_from:
         msg = f"{restart_offer_from} asked to restart. Click Restart to accept."
-        banner = font.render(msg, True, YELLOW)
+        banner = glyph(font, msg, YELLOW)
         screen.blit(banner, (MARGIN, restart_btn.bottom + 8))
 
 def draw_chat():
+    global _chat_surface, _chat_log_dirty
     # input box
     pygame.draw.rect(screen, WHITE, chat_box, border_radius=8)
     pygame.draw.rect(screen, BLACK, chat_box, width=2, border_radius=8)
     hint = "> " + (chat_text if chat_input_active else (chat_text or "Type message…"))
     col = BLACK if chat_input_active or chat_text else (130, 130, 130)
-    t = font.render(hint[:120], True, col)
+    t = glyph(font, hint[:120], col)
     screen.blit(t, (chat_box.x + 8, chat_box.y + 6))
 
-    # chat log (last 8 lines)
-    y = chat_box.bottom + 8
+    # chat log (last 8 lines): composed into one surface when it changes,
+    # then a single blit per frame
     max_lines = 8
-    for name, msg in chat_lines[-max_lines:]:
-        line = font_small.render(f"{name}: {msg}", True, BLACK)
-        screen.blit(line, (MARGIN, y))
-        y += line.get_height() + 2
+    if _chat_log_dirty or _chat_surface is None:
+        line_h = font_small.get_height() + 2
+        _chat_surface = pygame.Surface((WIDTH - MARGIN * 2, max_lines * line_h))
+        _chat_surface.fill(WHITE)
+        y = 0
+        for name, msg in chat_lines[-max_lines:]:
+            line = glyph(font_small, f"{name}: {msg}", BLACK)
+            _chat_surface.blit(line, (0, y))
+            y += line_h
+        _chat_log_dirty = False
+    screen.blit(_chat_surface, (MARGIN, chat_box.bottom + 8))
 
 def draw_connection_overlay():
     # dim
@@ -217,7 +295,7 @@ def draw_connection_overlay():
     screen.blit(overlay, (0, 0))
     # text
     msg = "Connecting…" if not connected else "Disconnected"
-    t = font.render(msg, True, WHITE)
+    t = glyph(font, msg, WHITE)
     screen.blit(t, (WIDTH//2 - t.get_width()//2, HEIGHT//2 - t.get_height()//2))
 
 def inside_board(mx, my) -> Optional[Tuple[int,int]]:
@@ -230,7 +308,7 @@ def inside_board(mx, my) -> Optional[Tuple[int,int]]:
 
 # ---------- Inbox handler ----------
 def handle_inbox():
-    global role, names, scores, board, turn, winner, restart_offer_from, turn_deadline_ms, name_me, disconnect_reason
+    global role, names, scores, board, turn, winner, restart_offer_from, turn_deadline_ms, name_me, disconnect_reason, _chat_log_dirty
     try:
         while True:
             msg = inbox.get_nowait()
@@ -239,10 +317,12 @@ def handle_inbox():
             if t == "_closed":
                 disconnect_reason = msg.get("reason", "")
                 # keep running so overlay shows
+                mark_dirty()
                 continue
 
             if t == "hello":
                 role = msg.get("role")
+                mark_dirty(STATUS_RECT)
                 continue
 
             if t == "state":
@@ -256,18 +336,27 @@ def handle_inbox():
                 names["O"] = players.get("O") or "O"
                 turn_deadline_ms = msg.get("turn_deadline_ms")
                 name_me = names.get(role or "", "") if role in ("X","O") else "spectator"
+                mark_dirty()
                 continue
 
             if t == "board_update":
-                board = msg.get("board", board)
+                new_board = msg.get("board", board)
+                # usually one move: upload just the cells that changed
+                for r in range(BOARD_ROWS):
+                    for c in range(BOARD_COLS):
+                        if new_board[r][c] != board[r][c]:
+                            mark_dirty(cell_rect(r, c))
+                board = new_board
                 turn = msg.get("turn", turn)
                 turn_deadline_ms = msg.get("turn_deadline_ms", turn_deadline_ms)
                 winner = None
+                mark_dirty(STATUS_RECT)
                 continue
 
             if t == "game_over":
                 board = msg.get("board", board)
                 winner = msg.get("winner")
+                mark_dirty()
                 continue
 
             if t == "new_game":
@@ -277,23 +366,40 @@ def handle_inbox():
                 scores.update(msg.get("scores", scores))
                 turn_deadline_ms = msg.get("turn_deadline_ms")
                 restart_offer_from = None
+                mark_dirty()
                 continue
 
             if t == "restart_offer":
                 restart_offer_from = msg.get("from")
+                mark_dirty(PANEL_RECT)
                 continue
 
             if t == "chat":
                 nm = msg.get("name") or msg.get("from") or "?"
                 chat_lines.append((nm, msg.get("msg","")))
+                _chat_log_dirty = True
+                mark_dirty(CHAT_RECT)
+                continue
+
+            if t == "chat_batch":
+                # the server coalesces bursty chat into one frame
+                for entry in msg.get("messages", []):
+                    nm = entry.get("name") or entry.get("from") or "?"
+                    chat_lines.append((nm, entry.get("msg","")))
+                _chat_log_dirty = True
+                mark_dirty(CHAT_RECT)
                 continue
 
             if t == "message":
                 chat_lines.append(("server", msg.get("msg","")))
+                _chat_log_dirty = True
+                mark_dirty(CHAT_RECT)
                 continue
 
             if t == "error":
                 chat_lines.append(("error", f"{msg.get('code','')}: {msg.get('msg','')}"))
+                _chat_log_dirty = True
+                mark_dirty(CHAT_RECT)
                 continue
 
             # ignore unknowns
@@ -304,39 +410,50 @@ def handle_inbox():
 def handle_mouse(mx, my, pressed):
     global restart_offer_from
     if pressed[0]:
+        mark_dirty(PANEL_RECT)
         # Buttons
         if restart_btn.collidepoint(mx, my):
-            outbox.put({"type": "restart_request"})
+            post({"type": "restart_request"})
             return
         if resign_btn.collidepoint(mx, my) and role in ("X","O"):
-            outbox.put({"type": "resign"})
+            post({"type": "resign"})
             return
         # Board click -> move
         idx = inside_board(mx, my)
         if idx and role in ("X","O"):
             r, c = idx
-            outbox.put({"type": "move", "row": r, "col": c})
+            post(bytes((OP_MOVE, r, c)))  # 3-byte frame, no JSON on the hot path
 
 def handle_key(event):
     global chat_input_active, chat_text
+    mark_dirty(CHAT_RECT)
     if event.key == pygame.K_RETURN:
         if chat_text.strip():
-            outbox.put({"type": "chat", "msg": chat_text.strip()[:180]})
+            post({"type": "chat", "msg": chat_text.strip()[:180]})
             chat_text = ""
         chat_input_active = not chat_input_active  # toggle focus on Enter
-    elif chat_input_active:
-        if event.key == pygame.K_BACKSPACE:
-            chat_text = chat_text[:-1]
+        # typed characters arrive as TEXTINPUT events (SDL's IME-aware
+        # path) only while the box has focus
+        if chat_input_active:
+            pygame.key.start_text_input()
         else:
-            # only allow reasonable characters
-            ch = event.unicode
-            if ch and ch.isprintable():
-                chat_text += ch
+            pygame.key.stop_text_input()
+    elif chat_input_active and event.key == pygame.K_BACKSPACE:
+        chat_text = chat_text[:-1]
+
+def handle_text(event):
+    global chat_text
+    if chat_input_active:
+        chat_text += event.text
+        mark_dirty(CHAT_RECT)
 
 # ---------- Main ----------
 def main():
     ws_thread = start_ws_thread()
+    pygame.key.stop_text_input()  # enabled on demand when chat gets focus
 
+    last_timer_sec = None
+    last_connected = None
     try:
         running = True
         while running:
@@ -345,6 +462,8 @@ def main():
                     running = False
                 elif event.type == pygame.KEYDOWN:
                     handle_key(event)
+                elif event.type == pygame.TEXTINPUT:
+                    handle_text(event)
 
             mx, my = pygame.mouse.get_pos()
             pressed = pygame.mouse.get_pressed(num_buttons=3)
@@ -352,22 +471,41 @@ def main():
             # Networking
             handle_inbox()
 
-            # Drawing
-            screen.fill(WHITE)
-            draw_status_bar()
-            draw_board()
-            draw_buttons()
-            draw_chat()
-
-            # Clicks (after drawing so button rects are valid)
+            # Clicks
             if any(pressed):
                 handle_mouse(mx, my, pressed)
 
-            # Connection overlay
-            if not connected:
-                draw_connection_overlay()
+            # Things that change without a message: the once-a-second timer
+            # text and the connection overlay
+            sec = None
+            if turn_deadline_ms:
+                import time as _t
+                sec = (max(0, turn_deadline_ms - int(_t.time() * 1000)) + 999)//1000
+            if sec != last_timer_sec:
+                last_timer_sec = sec
+                mark_dirty(TIMER_RECT)
+            if connected != last_connected:
+                last_connected = connected
+                mark_dirty()
+
+            # Drawing — skip entirely when nothing changed. The backbuffer is
+            # redrawn in full (cheap with cached glyphs); only dirty regions
+            # get uploaded, unless they cover most of the window.
+            if dirty_rects:
+                screen.fill(WHITE)
+                draw_status_bar()
+                draw_board()
+                draw_buttons()
+                draw_chat()
+                if not connected:
+                    draw_connection_overlay()
+                area = sum(r.w * r.h for r in dirty_rects)
+                if area >= FULL_RECT.w * FULL_RECT.h // 2:
+                    pygame.display.flip()
+                else:
+                    pygame.display.update(dirty_rects)
+                dirty_rects.clear()
 
-            pygame.display.flip()
             clock.tick(FPS)
     finally:
         stop_flag.set()
@@ -1,14 +1,17 @@
-# server.py
+# socksoccerserver.py
 # Sock Soccer — authoritative websocket server
-# Dependencies: pip install websockets
-# Run: python server.py  (default ws://localhost:8765)
+# Dependencies: pip install websockets msgspec
+# Run: python socksoccerserver.py  (default ws://localhost:8765)
 
 import asyncio
-import json
 import math
+from math import sqrt  # local name: skips the attribute lookup on hot paths
 import os
 import random
 import time
+import zlib
+import msgspec
+import numpy as np
 import websockets
 from dataclasses import dataclass, field
 from typing import Dict, List, Tuple
@@ -27,6 +30,7 @@ PLAYER_R = 18
 MAX_PLAYERS = 4
 WIN_GOALS = 5
 ROUND_SECONDS = 180
+KEYFRAME_TICKS = 30  # full snapshot every ~1 s; deltas in between
 
 PLAYER_SPEED = 320.0
 SPRINT_MULT = 1.35
@@ -43,6 +47,109 @@ TEAM_BLUE = 1
 
 def clamp(v,a,b): return max(a, min(b, v))
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; without it the kernel runs as plain Python
+    def njit(*args, **kwargs):
+        def wrap(f): return f
+        return wrap
+
+@njit(cache=True, fastmath=True)
+def _step(px, py, pvx, pvy, bx, by, bvx, bvy, dt):
+    # one tick of numeric physics: player friction/integration/wall clamp,
+    # ball integration/friction, and ball-player collisions. Goal detection
+    # stays outside (it has side effects). Compiled to native code by numba.
+    n = px.shape[0]
+    for i in range(n):
+        pvx[i] *= PLAYER_FRICTION
+        pvy[i] *= PLAYER_FRICTION
+        px[i] += pvx[i] * dt
+        py[i] += pvy[i] * dt
+        if px[i] < PLAYER_R:
+            px[i] = PLAYER_R; pvx[i] = 0.0
+        elif px[i] > FIELD_W - PLAYER_R:
+            px[i] = FIELD_W - PLAYER_R; pvx[i] = 0.0
+        if py[i] < PLAYER_R:
+            py[i] = PLAYER_R; pvy[i] = 0.0
+        elif py[i] > FIELD_H - PLAYER_R:
+            py[i] = FIELD_H - PLAYER_R; pvy[i] = 0.0
+
+    bx += bvx * dt
+    by += bvy * dt
+    bvx *= BALL_FRICTION
+    bvy *= BALL_FRICTION
+
+    rad = BALL_R + PLAYER_R
+    rad2 = rad * rad
+    for i in range(n):
+        dx = bx - px[i]
+        dy = by - py[i]
+        dist2 = dx*dx + dy*dy
+        if dist2 < rad2:
+            dist = math.sqrt(dist2)
+            if dist < 0.0001:
+                dist = 0.0001
+            inv = 1.0 / dist
+            nx, ny = dx * inv, dy * inv
+            # separate
+            overlap = rad - dist
+            bx += nx * overlap * 0.6
+            by += ny * overlap * 0.6
+            # transfer velocity (simple impulse)
+            rel_vx = bvx - pvx[i]
+            rel_vy = bvy - pvy[i]
+            dot = rel_vx*nx + rel_vy*ny
+            if dot < 0:
+                bvx -= nx * dot
+                bvy -= ny * dot
+            # small push from player's movement
+            bvx += pvx[i] * 0.25
+            bvy += pvy[i] * 0.25
+    return bx, by, bvx, bvy
+
+# ---- wire format: msgpack (binary frames) ----
+# Snapshots go out 30 times a second to every client; msgspec encodes/decodes
+# an order of magnitude faster than stdlib json and the frames are smaller.
+
+# coords/velocities travel as fixed-point ints (value * COORD_SCALE): 0.25-unit
+# resolution on a 1200x700 field, and msgpack packs small ints in 1-3 bytes
+# where a float costs 9. Clients divide by COORD_SCALE when reading.
+COORD_SCALE = 4
+
+class PlayerView(msgspec.Struct):
+    id: str
+    name: str
+    team: int
+    x: int
+    y: int
+    vx: int
+    vy: int
+    stamina: float
+    cooldown: float
+
+class BallView(msgspec.Struct):
+    x: int
+    y: int
+    vx: int
+    vy: int
+
+class Snapshot(msgspec.Struct):
+    t: float
+    field: Tuple[int, int, int, int]
+    score: Tuple[int, int]
+    timer: int
+    players: List[PlayerView]
+    ball: BallView
+    event: str
+
+enc = msgspec.msgpack.Encoder()
+# inbound messages are heterogeneous (join/input/ping), so decode untyped
+dec = msgspec.msgpack.Decoder()
+
+# constant payloads get encoded exactly once, at import time
+REJECT_BYTES = enc.encode({"type": "reject", "reason": "Server full or bad join"})
+
 @dataclass
 class Player:
     pid: str
@@ -71,6 +178,17 @@ class Ball:
 
 @dataclass
 class Game:
+    # geometry derived once instead of per tick inside physics_ball
+    GOAL_TOP = (FIELD_H - GOAL_H) / 2
+    GOAL_BOTTOM = (FIELD_H - GOAL_H) / 2 + GOAL_H
+    RAD = BALL_R + PLAYER_R
+    RAD2 = (BALL_R + PLAYER_R) ** 2
+    KICK_RANGE2 = (PLAYER_R + BALL_R + 6) ** 2
+    LEFT_WALL = BALL_R
+    RIGHT_WALL = FIELD_W - BALL_R
+    TOP_WALL = BALL_R
+    BOTTOM_WALL = FIELD_H - BALL_R
+
     players: Dict[str, Player] = field(default_factory=dict)
     sockets: Dict[str, websockets.WebSocketServerProtocol] = field(default_factory=dict)
     ball: Ball = field(default_factory=lambda: Ball(x=FIELD_W/2, y=FIELD_H/2))
@@ -79,11 +197,54 @@ class Game:
     round_end_ts: float = field(default_factory=lambda: time.time() + ROUND_SECONDS)
     last_event: str = ""  # brief toast text
     last_event_t: float = 0.0
+    # kinematics live in struct-of-arrays form so physics runs as numpy ops
+    # instead of a per-player Python loop; Player dataclasses keep the rest
+    # (name, team, stamina, ...) and get positions synced back at snapshot time
+    px: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    py: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    pvx: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    pvy: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    _pids: List[str] = field(default_factory=list)          # row -> pid
+    _pidx: Dict[str, int] = field(default_factory=dict)     # pid -> row
+    # stable list mirror of players.values(); hot loops iterate this instead
+    # of allocating list(dict.values()) copies every tick
+    players_list: List[Player] = field(default_factory=list)
+    snap_bytes: bytes = b""  # last encoded keyframe, replayed to late joiners
+    queues: Dict[str, asyncio.Queue] = field(default_factory=dict)
+    # diff baselines for delta snapshots
+    tick_no: int = 0
+    _prev_p: Dict[str, dict] = field(default_factory=dict)
+    _prev_b: dict = field(default_factory=dict)
+    _prev_score: Tuple[int, int] = (0, 0)
+    _prev_timer: int = -1
+    # reusable snapshot objects: the template and its player slots are
+    # mutated in place each keyframe instead of reallocated
+    _snap: Snapshot = field(default_factory=lambda: Snapshot(
+        t=0.0, field=(FIELD_W, FIELD_H, GOAL_W, GOAL_H), score=(0, 0),
+        timer=0, players=[], ball=BallView(x=0, y=0, vx=0, vy=0), event=""))
+    _pviews: List[PlayerView] = field(default_factory=lambda: [
+        PlayerView(id="", name="", team=0, x=0, y=0, vx=0, vy=0,
+                   stamina=0.0, cooldown=0.0) for _ in range(MAX_PLAYERS)])
 
     async def broadcast(self, msg: dict):
-        if not self.sockets: return
-        data = json.dumps(msg)
-        await asyncio.gather(*[ws.send(data) for ws in list(self.sockets.values()) if ws])
+        await self.broadcast_bytes(enc.encode(msg))
+
+    async def broadcast_bytes(self, data: bytes):
+        # fan out via per-client queues; each client has a writer task, so
+        # a slow peer backs up its own queue instead of stalling the tick
+        for q in self.queues.values():
+            if q.full():
+                # stale real-time state: drop the oldest frame
+                try: q.get_nowait()
+                except asyncio.QueueEmpty: pass
+            q.put_nowait(data)
+
+    async def _writer(self, ws, q: asyncio.Queue):
+        try:
+            while True:
+                await ws.send(await q.get())
+        except websockets.ConnectionClosed:
+            pass
 
     def reset_positions(self, after_goal: bool = True):
         # players spawn in halves
@@ -95,8 +256,9 @@ class Game:
                 sx, sy = red_slots[r_i % len(red_slots)]; r_i += 1
             else:
                 sx, sy = blue_slots[b_i % len(blue_slots)]; b_i += 1
-            p.x, p.y = sx + random.uniform(-20, 20), sy + random.uniform(-20, 20)
-            p.vx = p.vy = 0.0
+            i = self._pidx[p.pid]
+            self.px[i], self.py[i] = sx + random.uniform(-20, 20), sy + random.uniform(-20, 20)
+            self.pvx[i] = self.pvy[i] = 0.0
             p.cooldown = 0.0
         self.ball.x, self.ball.y = FIELD_W/2, FIELD_H/2
         self.ball.vx = self.ball.vy = 0.0
@@ -120,84 +282,70 @@ class Game:
             y=FIELD_H/2
         )
         self.players[pid] = p
+        self.players_list.append(p)
+        self._pidx[pid] = len(self._pids)
+        self._pids.append(pid)
+        self.px = np.append(self.px, p.x)
+        self.py = np.append(self.py, p.y)
+        self.pvx = np.append(self.pvx, 0.0)
+        self.pvy = np.append(self.pvy, 0.0)
 
     def remove_player(self, pid: str):
-        if pid in self.players:
-            del self.players[pid]
+        p = self.players.pop(pid, None)
+        if p is not None:
+            self.players_list.remove(p)
         if pid in self.sockets:
             del self.sockets[pid]
-
-    def physics_player(self, p: Player, dt: float):
-        # movement from input is applied in handle_input; here, friction + bounds
-        p.vx *= PLAYER_FRICTION
-        p.vy *= PLAYER_FRICTION
-        p.x += p.vx * dt
-        p.y += p.vy * dt
-        # walls
-        if p.x < PLAYER_R: p.x = PLAYER_R; p.vx = 0
-        if p.x > FIELD_W-PLAYER_R: p.x = FIELD_W-PLAYER_R; p.vx = 0
-        if p.y < PLAYER_R: p.y = PLAYER_R; p.vy = 0
-        if p.y > FIELD_H-PLAYER_R: p.y = FIELD_H-PLAYER_R; p.vy = 0
-
-    def physics_ball(self, dt: float):
+        if pid in self.queues:
+            del self.queues[pid]
+        i = self._pidx.pop(pid, None)
+        if i is not None:
+            self._pids.pop(i)
+            self.px = np.delete(self.px, i)
+            self.py = np.delete(self.py, i)
+            self.pvx = np.delete(self.pvx, i)
+            self.pvy = np.delete(self.pvy, i)
+            self._pidx = {q: j for j, q in enumerate(self._pids)}
+
+    def _sync_players(self):
+        # pull array state back onto the dataclasses (snapshot path only)
+        for pid, i in self._pidx.items():
+            p = self.players[pid]
+            p.x = float(self.px[i]); p.y = float(self.py[i])
+            p.vx = float(self.pvx[i]); p.vy = float(self.pvy[i])
+
+    def step(self, dt: float):
+        # numeric kernel (players + ball + collisions) runs JIT-compiled;
+        # goal detection and event side effects stay here
         b = self.ball
-        b.x += b.vx * dt
-        b.y += b.vy * dt
-        b.vx *= BALL_FRICTION
-        b.vy *= BALL_FRICTION
+        b.x, b.y, b.vx, b.vy = _step(self.px, self.py, self.pvx, self.pvy,
+                                     b.x, b.y, b.vx, b.vy, dt)
 
         # walls (except goals openings)
         # Left and right walls have goal gaps vertically centered
-        goal_top = (FIELD_H - GOAL_H) / 2
-        goal_bottom = goal_top + GOAL_H
-
         # left wall
-        if b.x - BALL_R < 0:
-            if goal_top < b.y < goal_bottom:
+        if b.x < self.LEFT_WALL:
+            if self.GOAL_TOP < b.y < self.GOAL_BOTTOM:
                 # goal for Blue (right team scores on left goal)
                 self.score_goal(scoring_team=TEAM_BLUE)
             else:
-                b.x = BALL_R; b.vx = abs(b.vx) * 0.7
+                b.x = self.LEFT_WALL; b.vx = abs(b.vx) * 0.7
         # right wall
-        if b.x + BALL_R > FIELD_W:
-            if goal_top < b.y < goal_bottom:
+        if b.x > self.RIGHT_WALL:
+            if self.GOAL_TOP < b.y < self.GOAL_BOTTOM:
                 # goal for Red
                 self.score_goal(scoring_team=TEAM_RED)
             else:
-                b.x = FIELD_W - BALL_R; b.vx = -abs(b.vx) * 0.7
+                b.x = self.RIGHT_WALL; b.vx = -abs(b.vx) * 0.7
         # top/bottom
-        if b.y - BALL_R < 0:
-            b.y = BALL_R; b.vy = abs(b.vy) * 0.7
-        if b.y + BALL_R > FIELD_H:
-            b.y = FIELD_H - BALL_R; b.vy = -abs(b.vy) * 0.7
-
-        # collisions with players
-        for p in self.players.values():
-            dx = b.x - p.x
-            dy = b.y - p.y
-            dist2 = dx*dx + dy*dy
-            rad = BALL_R + PLAYER_R
-            if dist2 < rad*rad:
-                dist = math.sqrt(dist2) if dist2 > 0 else 0.0001
-                nx, ny = dx / dist, dy / dist
-                # separate
-                overlap = rad - dist
-                b.x += nx * overlap * 0.6
-                b.y += ny * overlap * 0.6
-                # transfer velocity (simple impulse)
-                rel_vx = b.vx - p.vx
-                rel_vy = b.vy - p.vy
-                dot = rel_vx*nx + rel_vy*ny
-                if dot < 0:
-                    b.vx -= nx * dot
-                    b.vy -= ny * dot
-                # small push from player's movement
-                b.vx += p.vx * 0.25
-                b.vy += p.vy * 0.25
+        if b.y < self.TOP_WALL:
+            b.y = self.TOP_WALL; b.vy = abs(b.vy) * 0.7
+        if b.y > self.BOTTOM_WALL:
+            b.y = self.BOTTOM_WALL; b.vy = -abs(b.vy) * 0.7
 
         # clamp tiny velocities
-        if abs(b.vx) < 4: b.vx = 0
-        if abs(b.vy) < 4: b.vy = 0
+        if -4 < b.vx < 4: b.vx = 0
+        if -4 < b.vy < 4: b.vy = 0
 
     def score_goal(self, scoring_team: int):
         if scoring_team == TEAM_RED:
@@ -221,11 +369,12 @@ class Game:
 
         p.aimx, p.aimy = aimx, aimy
 
+        i = self._pidx[p.pid]
         speed = PLAYER_SPEED * (SPRINT_MULT if sprint and p.stamina > 0 else 1.0)
         ax = (right - left) * speed
         ay = (down - up) * speed
-        p.vx += ax * dt
-        p.vy += ay * dt
+        self.pvx[i] += ax * dt
+        self.pvy[i] += ay * dt
 
         # stamina
         if sprint and (abs(ax) > 0 or abs(ay) > 0):
@@ -237,18 +386,22 @@ class Game:
         # kicking
         if kick and p.cooldown <= 0.0:
             # if close to ball, apply impulse along aim
-            dx = self.ball.x - p.x
-            dy = self.ball.y - p.y
-            if dx*dx + dy*dy <= (PLAYER_R + BALL_R + 6)**2:
-                # normalize aim or use to ball direction if aim nearly zero
-                mag = math.hypot(aimx, aimy)
-                if mag < 0.2:
+            dx = self.ball.x - float(self.px[i])
+            dy = self.ball.y - float(self.py[i])
+            if dx*dx + dy*dy <= self.KICK_RANGE2:
+                # normalize aim or use to ball direction if aim nearly zero;
+                # compare squared magnitudes so the common case skips sqrt,
+                # and normalize with one reciprocal sqrt instead of two divides
+                mag2 = aimx*aimx + aimy*aimy
+                if mag2 < 0.04:
                     if dx == dy == 0:
                         ux, uy = 1.0, 0.0
                     else:
-                        m = math.hypot(dx, dy); ux, uy = dx/m, dy/m
+                        inv = 1.0 / sqrt(dx*dx + dy*dy)
+                        ux, uy = dx*inv, dy*inv
                 else:
-                    ux, uy = aimx/mag, aimy/mag
+                    inv = 1.0 / sqrt(mag2)
+                    ux, uy = aimx*inv, aimy*inv
                 self.ball.vx += ux * KICK_IMPULSE
                 self.ball.vy += uy * KICK_IMPULSE
                 self.last_event = f"{p.name} kicked!"
@@ -265,24 +418,79 @@ class Game:
         if self.score_blue > self.score_red: return "Blue wins!"
         return "Draw!"
 
-    def snapshot(self) -> dict:
-        return {
-            "t": time.time(),
-            "field": [FIELD_W, FIELD_H, GOAL_W, GOAL_H],
-            "score": [self.score_red, self.score_blue],
-            "timer": max(0, int(self.round_end_ts - time.time())),
-            "players": [
-                {
-                    "id": p.pid, "name": p.name, "team": p.team,
-                    "x": round(p.x,2), "y": round(p.y,2),
-                    "vx": round(p.vx,2), "vy": round(p.vy,2),
-                    "stamina": round(p.stamina,1), "cooldown": round(p.cooldown,2),
-                } for p in self.players.values()
-            ],
-            "ball": {"x": round(self.ball.x,2), "y": round(self.ball.y,2),
-                     "vx": round(self.ball.vx,2), "vy": round(self.ball.vy,2)},
-            "event": (self.last_event if (time.time()-self.last_event_t)<1.2 else "")
-        }
+    def snapshot(self) -> Snapshot:
+        self._sync_players()
+        snap = self._snap
+        snap.t = time.time()
+        snap.score = (self.score_red, self.score_blue)
+        snap.timer = max(0, int(self.round_end_ts - time.time()))
+        for i, p in enumerate(self.players.values()):
+            v = self._pviews[i]
+            v.id = p.pid; v.name = p.name; v.team = p.team
+            v.x = int(p.x*COORD_SCALE); v.y = int(p.y*COORD_SCALE)
+            v.vx = int(p.vx*COORD_SCALE); v.vy = int(p.vy*COORD_SCALE)
+            v.stamina = p.stamina; v.cooldown = p.cooldown
+        snap.players = self._pviews[:len(self.players)]
+        b = snap.ball
+        b.x = int(self.ball.x*COORD_SCALE); b.y = int(self.ball.y*COORD_SCALE)
+        b.vx = int(self.ball.vx*COORD_SCALE); b.vy = int(self.ball.vy*COORD_SCALE)
+        snap.event = (self.last_event if (time.time()-self.last_event_t)<1.2 else "")
+        return snap
+
+    def delta(self) -> dict:
+        # fields that changed since last tick, keyed the same as the full
+        # snapshot; a removed player shows up as pid -> None. Also advances
+        # the diff baseline, so call exactly once per tick.
+        self._sync_players()
+        msg: dict = {"type": "delta"}
+        dp = {}
+        for p in self.players.values():
+            x = int(p.x*COORD_SCALE); y = int(p.y*COORD_SCALE)
+            vx = int(p.vx*COORD_SCALE); vy = int(p.vy*COORD_SCALE)
+            st = round(p.stamina, 1); cd = round(p.cooldown, 2)
+            prev = self._prev_p.get(p.pid)
+            if prev is None:
+                # one dict per player lifetime; mutated in place afterwards
+                prev = self._prev_p[p.pid] = {"x": x, "y": y, "vx": vx, "vy": vy,
+                                              "stamina": st, "cooldown": cd}
+                dp[p.pid] = dict(prev)
+            else:
+                ch = None
+                if prev["x"] != x: prev["x"] = x; ch = {"x": x}
+                if prev["y"] != y: prev["y"] = y; ch = ch or {}; ch["y"] = y
+                if prev["vx"] != vx: prev["vx"] = vx; ch = ch or {}; ch["vx"] = vx
+                if prev["vy"] != vy: prev["vy"] = vy; ch = ch or {}; ch["vy"] = vy
+                if prev["stamina"] != st: prev["stamina"] = st; ch = ch or {}; ch["stamina"] = st
+                if prev["cooldown"] != cd: prev["cooldown"] = cd; ch = ch or {}; ch["cooldown"] = cd
+                if ch:
+                    dp[p.pid] = ch
+        if len(self._prev_p) != len(self.players):  # someone left
+            for pid in [q for q in self._prev_p if q not in self.players]:
+                del self._prev_p[pid]
+                dp[pid] = None
+        if dp:
+            msg["p"] = dp
+        b = self.ball
+        pb = self._prev_b
+        ch = None
+        for k, v in (("x", int(b.x*COORD_SCALE)), ("y", int(b.y*COORD_SCALE)),
+                     ("vx", int(b.vx*COORD_SCALE)), ("vy", int(b.vy*COORD_SCALE))):
+            if pb.get(k) != v:
+                pb[k] = v
+                ch = ch or {}; ch[k] = v
+        if ch:
+            msg["b"] = ch
+        score = (self.score_red, self.score_blue)
+        if score != self._prev_score:
+            self._prev_score = score
+            msg["score"] = list(score)
+        timer = max(0, int(self.round_end_ts - time.time()))
+        if timer != self._prev_timer:
+            self._prev_timer = timer
+            msg["timer"] = timer
+        if (time.time() - self.last_event_t) < 1.2 and self.last_event:
+            msg["event"] = self.last_event
+        return msg if len(msg) > 1 else {}
 
 game = Game()
 
@@ -290,36 +498,56 @@ async def handle_client(ws, path):
     # simple join handshake: receive {"type":"join","name":"..."}
     try:
         raw = await ws.recv()
-        msg = json.loads(raw)
+        msg = dec.decode(raw)
         if msg.get("type") != "join" or len(game.players) >= MAX_PLAYERS:
-            await ws.send(json.dumps({"type":"reject", "reason":"Server full or bad join"}))
+            await ws.send(REJECT_BYTES)
             return
 
         pid = os.urandom(4).hex()
         name = msg.get("name","Player")
         game.add_player(pid, name)
         game.sockets[pid] = ws
-
-        await ws.send(json.dumps({"type":"welcome","id":pid,"team":game.players[pid].team}))
+        q = asyncio.Queue(maxsize=64)
+        game.queues[pid] = q
+        writer = asyncio.create_task(game._writer(ws, q))
+
+        await ws.send(enc.encode({"type":"welcome","id":pid,"team":game.players[pid].team}))
+        if game.snap_bytes:
+            # late joiner: replay this tick's frame instead of re-encoding
+            q.put_nowait(game.snap_bytes)
         await game.broadcast({"type":"toast","msg":f"{name} joined!"})
 
         async for raw in ws:
             try:
-                data = json.loads(raw)
+                data = dec.decode(raw)
             except Exception:
                 continue
-            if data.get("type") == "input":
-                p = game.players.get(pid)
-                if not p: continue
-                p.last_input_ts = time.time()
-                game.handle_input(p, data.get("data", {}), DT)
-            elif data.get("type") == "ping":
-                await ws.send(json.dumps({"type":"pong","t":data.get("t")}))
+            # clients may coalesce several messages into one "batch" frame
+            if data.get("type") == "batch":
+                batch = [m for m in data.get("msgs", []) if isinstance(m, dict)]
+            else:
+                batch = (data,)
+            for data in batch:
+                if data.get("type") == "input":
+                    p = game.players.get(pid)
+                    if not p: continue
+                    p.last_input_ts = time.time()
+                    game.handle_input(p, data.get("data", {}), DT)
+                elif data.get("type") == "ping":
+                    # replies go through the writer so one task owns the
+                    # socket; same drop-oldest policy as broadcast_bytes so
+                    # a full queue doesn't raise out of the handler
+                    if q.full():
+                        try: q.get_nowait()
+                        except asyncio.QueueEmpty: pass
+                    q.put_nowait(enc.encode({"type":"pong","t":data.get("t")}))
     except websockets.ConnectionClosed:
         pass
     finally:
         # disconnect
         # mark disconnected, remove after broadcast
+        if 'writer' in locals():
+            writer.cancel()
         p = game.players.get(pid) if 'pid' in locals() else None
         if p:
             name = p.name
@@ -327,21 +555,24 @@ async def handle_client(ws, path):
             await game.broadcast({"type":"toast","msg":f"{name} left."})
 
 async def game_loop():
-    last = time.time()
+    # fixed 30 Hz cadence on the loop's monotonic clock; wall-clock
+    # time.time() can jump and has coarse resolution on Windows
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
     while True:
-        now = time.time()
-        # fixed-ish tick
-        await asyncio.sleep(max(0, DT - (now - last)))
-        last = time.time()
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+        next_tick += DT
+        if loop.time() - next_tick > 3 * DT:
+            # fell way behind (pause/suspend): resync instead of bursting
+            next_tick = loop.time() + DT
 
         dt = DT
-        # tick players
-        for p in list(game.players.values()):
+        # tick cooldowns
+        for p in game.players_list:
             if p.cooldown > 0: p.cooldown -= dt
-            game.physics_player(p, dt)
 
-        # tick ball
-        game.physics_ball(dt)
+        # tick physics (players + ball)
+        game.step(dt)
 
         # end round?
         if game.round_over():
@@ -351,17 +582,37 @@ async def game_loop():
             game.round_end_ts = time.time() + ROUND_SECONDS
             game.reset_positions(after_goal=False)
 
-        # broadcast snapshot
-        snap = game.snapshot()
-        await game.broadcast({"type":"state","data":snap})
+        # broadcast: deltas between keyframes, a full snapshot every second.
+        # Either way the frame is encoded (and compressed) once and shared.
+        game.tick_no += 1
+        delta = game.delta()  # advances the diff baseline every tick
+        if game.tick_no % KEYFRAME_TICKS == 0:
+            raw = enc.encode({"type":"state","data":game.snapshot()})
+            z = zlib.compress(raw, 6)
+            game.snap_bytes = enc.encode({"type":"state_z","z":z}) if len(z) + 16 < len(raw) else raw
+            await game.broadcast_bytes(game.snap_bytes)
+        elif delta:
+            await game.broadcast_bytes(enc.encode(delta))
 
 async def main():
-    server = await websockets.serve(handle_client, "0.0.0.0", 8765, ping_interval=15, ping_timeout=15)
+    # warm the JIT on an empty roster so the first real tick doesn't stutter
+    _step(np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0),
+          FIELD_W/2, FIELD_H/2, 0.0, 0.0, DT)
+    # per-connection permessage-deflate would recompress the same snapshot
+    # once per client and bloat tiny input frames; we compress the shared
+    # snapshot once in the game loop instead
+    server = await websockets.serve(handle_client, "0.0.0.0", 8765, ping_interval=15, ping_timeout=15,
+                                    subprotocols=["msgpack"], compression=None)
     print("Server listening on ws://0.0.0.0:8765")
     await game_loop()
     await server.wait_closed()
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass  # stock asyncio works too (uvloop is not available on Windows)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
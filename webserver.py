@@ -1,15 +1,20 @@
-# server.py — WebSocket TicTacToe with restart + QoL
+# webserver.py — WebSocket TicTacToe with restart + QoL
 import asyncio
-import json
+import multiprocessing
 import os
+import socket
 import time
+from enum import IntEnum
 from typing import Any, Dict, List, Optional, Set, Tuple
 
+import orjson
 import websockets
+from websockets.frames import OP_TEXT, Frame
 from websockets.server import WebSocketServerProtocol as WSS
 
 HOST = "0.0.0.0"
 PORT = int(os.getenv("PORT", "5000"))
+WORKERS = int(os.getenv("WORKERS", "1"))
 
 # ====== Game Config ======
 MARKS = ["X", "O"]
@@ -17,104 +22,233 @@ BOARD_SIZE = 3
 ENABLE_TURN_TIMER = False        # set True to enforce per-turn timer
 TURN_SECONDS = 20                # turn time if enabled
 PING_INTERVAL = 25               # seconds between heartbeats
+PING_TIMEOUT = 5                 # max seconds to wait on heartbeat replies
+BROADCAST_TIMEOUT = 5            # max seconds a broadcast waits on slow peers
+SLOW_CLIENT_LIMIT = 256 * 1024   # close clients whose send buffer backs up past this
+CHAT_BATCH_WINDOW = 0.02         # seconds to buffer chat before flushing
+CHAT_BATCH_MAX = 8               # flush early once this many chats are buffered
+OP_MOVE = 0x01                   # binary move frame: b"\x01" + row + col
 
 # ====== Utility ======
 async def send_json(ws: WSS, obj: Any):
-    await ws.send(json.dumps(obj))
+    await ws.send(orjson.dumps(obj))
 
 async def broadcast(targets: Set[WSS], obj: Any):
+    # serialize once and pass the same payload to every recipient;
+    # callers may also hand in an already-encoded str/bytes payload
     if not targets:
         return
-    await asyncio.gather(*(send_json(ws, obj) for ws in list(targets)), return_exceptions=True)
+    payload = obj if isinstance(obj, (str, bytes)) else orjson.dumps(obj)
+    recipients = list(targets)
+    if len(recipients) <= 4:
+        # the typical room is 2 players plus a spectator or two; a plain
+        # sequential loop skips gather/wait's per-send Task allocations,
+        # and ws.send only yields to the loop when backpressured
+        for ws in recipients:
+            if _too_slow(ws):
+                continue
+            try:
+                await ws.send(payload)
+            except websockets.ConnectionClosed:
+                room.drop_ws(ws)
+        return
+    tasks = {asyncio.create_task(ws.send(payload)): ws
+             for ws in recipients if not _too_slow(ws)}
+    if not tasks:
+        return
+    done, pending = await asyncio.wait(tasks, timeout=BROADCAST_TIMEOUT)
+    for t in pending:
+        t.cancel()
+    for t in done:
+        # evict dead peers now so the next broadcast doesn't retry them
+        if isinstance(t.exception(), websockets.ConnectionClosed):
+            room.drop_ws(tasks[t])
+
+def broadcast_nowait(targets: Set[WSS], obj: Any):
+    # fire-and-forget: serialize the websocket frame once and write it
+    # straight to each transport, skipping a send()/drain() round-trip per
+    # recipient. Only for traffic where the caller doesn't care about send
+    # completion (chat, state pushes); frames held here are buffered by the
+    # transport, so this trades a little memory for latency. Requires
+    # compression=None on serve() so a handcrafted frame is valid.
+    if not targets:
+        return
+    payload = obj if isinstance(obj, (str, bytes)) else orjson.dumps(obj)
+    if isinstance(payload, str):
+        payload = payload.encode()
+    frame = Frame(OP_TEXT, payload).serialize(mask=False)
+    for ws in list(targets):
+        if _too_slow(ws):
+            continue
+        transport = ws.transport
+        if transport is not None and not transport.is_closing():
+            transport.write(frame)
+
+def _too_slow(ws: WSS) -> bool:
+    # a consumer that stopped reading would otherwise buffer broadcasts
+    # without bound; shed it (1013 = try again later) instead of letting
+    # its backlog grow or stall the room
+    transport = ws.transport
+    if transport is not None and transport.get_write_buffer_size() > SLOW_CLIENT_LIMIT:
+        asyncio.create_task(ws.close(code=1013))
+        return True
+    return False
 
 def now_ms() -> int:
     return int(time.time() * 1000)
 
 # ====== Game Logic ======
+# the 8 winning lines as 9-bit masks, bit index = row*3 + col
+WIN_MASKS = (0b111000000, 0b000111000, 0b000000111,
+             0b100100100, 0b010010010, 0b001001001,
+             0b100010001, 0b001010100)
+FULL_MASK = 0b111111111
+
+class MoveResult(IntEnum):
+    # play() returns one of these instead of allocating a dict per move;
+    # the handler maps errors through MOVE_ERRORS and reads the board/
+    # winner off the game itself for the two hot outcomes
+    BOARD_UPDATE = 0
+    GAME_OVER = 1
+    ERR_GAME_FINISHED = 2
+    ERR_BAD_COORDS = 3
+    ERR_SPACE_FULL = 4
+    ERR_NOT_YOUR_TURN = 5
+
+# error payloads are constant, so encode them once at import time and
+# send the bytes directly instead of re-serializing per rejection
+MOVE_ERRORS: Dict[int, bytes] = {
+    MoveResult.ERR_GAME_FINISHED: orjson.dumps({"type": "error", "code": "game_finished", "msg": "Game already finished."}),
+    MoveResult.ERR_BAD_COORDS: orjson.dumps({"type": "error", "code": "bad_coords", "msg": "Invalid coordinates."}),
+    MoveResult.ERR_SPACE_FULL: orjson.dumps({"type": "error", "code": "space_full", "msg": "That square is taken."}),
+    MoveResult.ERR_NOT_YOUR_TURN: orjson.dumps({"type": "error", "code": "not_your_turn", "msg": "It is not your turn."}),
+}
+
+ERR_BAD_JSON = orjson.dumps({"type": "error", "code": "bad_json", "msg": "Invalid JSON."})
+ERR_BAD_MOVE_COORDS = orjson.dumps({"type": "error", "code": "bad_coords", "msg": "row/col must be integers."})
+ERR_NOT_PLAYER_MOVE = orjson.dumps({"type": "error", "code": "not_player", "msg": "Spectators cannot move."})
+ERR_NOT_PLAYER_RESIGN = orjson.dumps({"type": "error", "code": "not_player", "msg": "Spectators cannot resign."})
+ERR_NOT_PLAYER_RESTART = orjson.dumps({"type": "error", "code": "not_player", "msg": "Only players can request restart."})
+
 class TicTacToe:
     def __init__(self):
+        # board stays the wire format; x_bits/o_bits mirror it for fast checks
         self.board: List[List[str]] = [[""] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+        self.x_bits: int = 0
+        self.o_bits: int = 0
+        self.move_count: int = 0
         self.turn: str = "O"  # will be overwritten by Room.start_new_game
         self.winner: Optional[str] = None
 
+    def reset(self, starting_mark: str):
+        # zero everything in place so restarts reuse the board lists
+        # instead of reallocating a fresh TicTacToe per game
+        for r in self.board:
+            for i in range(BOARD_SIZE):
+                r[i] = ""
+        self.x_bits = self.o_bits = self.move_count = 0
+        self.turn = starting_mark
+        self.winner = None
+
     def as_dict(self) -> Dict[str, Any]:
         return {"board": self.board, "turn": self.turn, "winner": self.winner}
 
-    def _line_winner(self, line: List[str]) -> str:
-        return line[0] if line[0] != "" and all(c == line[0] for c in line) else ""
-
     def check_win(self) -> str:
-        # rows
-        for r in self.board:
-            w = self._line_winner(r)
-            if w:
-                return w
-        # cols
-        for c in range(BOARD_SIZE):
-            col = [self.board[r][c] for r in range(BOARD_SIZE)]
-            w = self._line_winner(col)
-            if w:
-                return w
-        # diags
-        main = [self.board[i][i] for i in range(BOARD_SIZE)]
-        w = self._line_winner(main)
-        if w:
-            return w
-        anti = [self.board[i][BOARD_SIZE - 1 - i] for i in range(BOARD_SIZE)]
-        w = self._line_winner(anti)
-        if w:
-            return w
+        for bits, mark in ((self.x_bits, "X"), (self.o_bits, "O")):
+            for m in WIN_MASKS:
+                if bits & m == m:
+                    return mark
         return ""
 
-    def is_full(self) -> bool:
-        return all(self.board[r][c] != "" for r in range(BOARD_SIZE) for c in range(BOARD_SIZE))
-
-    def play(self, row: int, col: int, mark: str) -> Dict[str, Any]:
+    def play(self, row: int, col: int, mark: str) -> MoveResult:
         if self.winner:
-            return {"type": "error", "code": "game_finished", "msg": "Game already finished."}
+            return MoveResult.ERR_GAME_FINISHED
         if not (0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE):
-            return {"type": "error", "code": "bad_coords", "msg": "Invalid coordinates."}
+            return MoveResult.ERR_BAD_COORDS
         if self.board[row][col] != "":
-            return {"type": "error", "code": "space_full", "msg": "That square is taken."}
+            return MoveResult.ERR_SPACE_FULL
         if self.turn != mark:
-            return {"type": "error", "code": "not_your_turn", "msg": "It is not your turn."}
+            return MoveResult.ERR_NOT_YOUR_TURN
 
         self.board[row][col] = mark
+        self.move_count += 1
+        if mark == "X":
+            self.x_bits |= 1 << (row * BOARD_SIZE + col)
+        else:
+            self.o_bits |= 1 << (row * BOARD_SIZE + col)
         win = self.check_win()
         if win:
             self.winner = win
-            return {"type": "game_over", "board": self.board, "winner": win}
-        if self.is_full():
+            return MoveResult.GAME_OVER
+        if self.move_count == BOARD_SIZE * BOARD_SIZE:
             self.winner = "draw"
-            return {"type": "game_over", "board": self.board, "winner": "draw"}
+            return MoveResult.GAME_OVER
 
         self.turn = "O" if self.turn == "X" else "X"
-        return {"type": "board_update", "board": self.board, "turn": self.turn}
+        return MoveResult.BOARD_UPDATE
 
 # ====== Room / Session ======
+class PlayerCtx:
+    # per-connection context: the hot path reads plain attributes instead
+    # of hashing the protocol object into a role dict on every message
+    __slots__ = ("ws", "role", "name")
+
+    def __init__(self, ws: WSS, role: str):
+        self.ws = ws
+        self.role = role  # "X"|"O"|"spectator"
+        self.name = role
+
 class Room:
     def __init__(self):
-        self.players: Dict[str, Optional[WSS]] = {"X": None, "O": None}
+        self.players: Dict[str, Optional[PlayerCtx]] = {"X": None, "O": None}
         self.player_names: Dict[str, str] = {"X": "X", "O": "O"}
         self.spectators: Set[WSS] = set()
-        self.role_by_ws: Dict[WSS, str] = {}  # "X"|"O"|"spectator"
+        self.ctx_by_ws: Dict[WSS, PlayerCtx] = {}
         self.scores: Dict[str, int] = {"X": 0, "O": 0}
         self.game = TicTacToe()
         self.awaiting_restart_from: Set[str] = set()  # marks that requested restart
         self.next_starting_mark = "O"  # alternates each new game
         self.turn_deadline_ms: Optional[int] = None
+        # incrementally maintained caches; rebuilding these per broadcast
+        # added a set+dict construction to every message
+        self._everyone: Set[WSS] = set()
+        self._players_view: Dict[str, Optional[str]] = {m: None for m in MARKS}
+        # monotonic state version + encoded payloads keyed by it, so that
+        # broadcasting the same state twice reuses one bytes object
+        self._version = 0
+        self._encoded_cache: Dict[int, bytes] = {}
+        # bursty chat is coalesced into one chat_batch broadcast per window
+        self._chat_buffer: List[Dict[str, Any]] = []
+        self._chat_flush_task: Optional[asyncio.Task] = None
+
+    def touch(self):
+        # some observable state changed; invalidate the encoded-state cache
+        self._version += 1
+        self._encoded_cache.clear()
 
     # ---- assignment ----
-    def assign_role(self, ws: WSS) -> str:
+    def assign_role(self, ws: WSS) -> PlayerCtx:
+        self.touch()
+        self._everyone.add(ws)
         for m in MARKS:
             if self.players[m] is None:
-                self.players[m] = ws
-                self.role_by_ws[ws] = m
-                return m
+                ctx = PlayerCtx(ws, m)
+                ctx.name = self.player_names[m]
+                self.players[m] = ctx
+                self.ctx_by_ws[ws] = ctx
+                self._players_view[m] = ctx.name
+                return ctx
         # otherwise spectator
+        ctx = PlayerCtx(ws, "spectator")
         self.spectators.add(ws)
-        self.role_by_ws[ws] = "spectator"
-        return "spectator"
+        self.ctx_by_ws[ws] = ctx
+        return ctx
+
+    def rename(self, ctx: PlayerCtx, name: str):
+        self.touch()
+        ctx.name = name
+        self.player_names[ctx.role] = name
+        self._players_view[ctx.role] = name
 
     def name_for(self, mark: str) -> str:
         return self.player_names.get(mark, mark)
@@ -125,70 +259,135 @@ class Room:
         return "O" if mark == "X" else "X"
 
     def ws_for_mark(self, mark: str) -> Optional[WSS]:
-        return self.players.get(mark)
+        ctx = self.players.get(mark)
+        return ctx.ws if ctx else None
 
     def drop_ws(self, ws: WSS):
-        role = self.role_by_ws.pop(ws, None)
+        self.touch()
+        self._everyone.discard(ws)
+        ctx = self.ctx_by_ws.pop(ws, None)
+        role = ctx.role if ctx else None
         if role in MARKS:
             self.players[role] = None
+            self._players_view[role] = None
             # if a player leaves mid game, no auto-reset; remaining can wait for someone to join
         elif role == "spectator":
             self.spectators.discard(ws)
 
     # ---- game control ----
     def start_new_game(self):
-        self.game = TicTacToe()
+        self.game.reset(self.next_starting_mark)
         # alternate starting player
-        self.game.turn = self.next_starting_mark
         self.next_starting_mark = "O" if self.game.turn == "X" else "X"
         self.awaiting_restart_from.clear()
         self._maybe_reset_turn_deadline()
 
     def _maybe_reset_turn_deadline(self):
+        self.touch()
         if ENABLE_TURN_TIMER:
             self.turn_deadline_ms = now_ms() + TURN_SECONDS * 1000
+            deadline_changed.set()  # wake the scheduler to re-sleep
         else:
             self.turn_deadline_ms = None
 
     def record_game_over(self, winner: str):
+        self.touch()
         if winner in MARKS:
             self.scores[winner] += 1
 
     def everyone(self) -> Set[WSS]:
-        s: Set[WSS] = set(self.spectators)
-        for m in MARKS:
-            if self.players[m] is not None:
-                s.add(self.players[m])
-        return s
+        return self._everyone
 
     def state_payload(self) -> Dict[str, Any]:
         return {
             "type": "state",
             "game": self.game.as_dict(),
             "scores": self.scores,
-            "players": {m: (self.player_names[m] if self.players[m] else None) for m in MARKS},
+            "players": self._players_view,
             "turn_deadline_ms": self.turn_deadline_ms,
         }
 
-    async def push_state(self):
-        await broadcast(self.everyone(), self.state_payload())
+    def queue_chat(self, entry: Dict[str, Any]):
+        # one framing+fan-out per chat burst instead of per message: flush
+        # after CHAT_BATCH_WINDOW or CHAT_BATCH_MAX buffered, whichever
+        # comes first; in-room ordering is preserved
+        self._chat_buffer.append(entry)
+        if len(self._chat_buffer) >= CHAT_BATCH_MAX:
+            if self._chat_flush_task is not None:
+                self._chat_flush_task.cancel()
+                self._chat_flush_task = None
+            self._flush_chat()
+        elif self._chat_flush_task is None:
+            self._chat_flush_task = asyncio.create_task(self._flush_chat_later())
+
+    async def _flush_chat_later(self):
+        await asyncio.sleep(CHAT_BATCH_WINDOW)
+        self._chat_flush_task = None
+        self._flush_chat()
+
+    def _flush_chat(self):
+        if self._chat_buffer:
+            batch, self._chat_buffer = self._chat_buffer, []
+            broadcast_nowait(self.everyone(), {"type": "chat_batch", "messages": batch})
+
+    def push_state(self):
+        # a burst of pushes at the same version (e.g. clients polling
+        # "request state") serializes once; setdefault would rebuild the
+        # payload dict and re-encode on every call even on a hit
+        payload = self._encoded_cache.get(self._version)
+        if payload is None:
+            payload = self._encoded_cache[self._version] = orjson.dumps(self.state_payload())
+        broadcast_nowait(self.everyone(), payload)
 
 room = Room()
 
-# ====== Timer Task (optional) ======
-async def turn_timer_task():
+# ====== Scheduler (heartbeat + optional turn timer) ======
+# set by _maybe_reset_turn_deadline so the scheduler re-sleeps to the new
+# deadline instead of polling at a fixed cadence
+deadline_changed = asyncio.Event()
+
+async def scheduler_task():
+    # one task that sleeps until the next deadline, replacing the separate
+    # 2 Hz turn-timer poll (which idled even with the timer disabled) and
+    # the 25 s heartbeat loop
+    next_ping = time.monotonic() + PING_INTERVAL
     while True:
-        await asyncio.sleep(0.5)
-        if not ENABLE_TURN_TIMER:
-            continue
-        if room.game.winner or room.game.turn not in MARKS:
-            continue
-        if room.turn_deadline_ms is None:
-            continue
-        if now_ms() >= room.turn_deadline_ms:
+        delay = next_ping - time.monotonic()
+        # ignore the turn deadline once the game is decided, otherwise a
+        # stale past deadline makes delay negative and the loop busy-spins
+        # until a restart clears it
+        if ENABLE_TURN_TIMER and room.turn_deadline_ms is not None and not room.game.winner:
+            delay = min(delay, room.turn_deadline_ms / 1000 - time.time())
+        try:
+            await asyncio.wait_for(deadline_changed.wait(), timeout=max(delay, 0))
+            deadline_changed.clear()
+            continue  # a deadline moved; recompute the sleep
+        except asyncio.TimeoutError:
+            pass
+
+        if time.monotonic() >= next_ping:
+            next_ping = time.monotonic() + PING_INTERVAL
+            if room._everyone:
+                # _everyone is maintained incrementally, so no set rebuild
+                # here; the timeout keeps a stuck peer from stretching the
+                # ping cycle
+                tasks = {asyncio.create_task(ws.ping()): ws for ws in room._everyone}
+                done, pending = await asyncio.wait(tasks, timeout=PING_TIMEOUT)
+                for p in pending:
+                    p.cancel()
+                for t in done:
+                    # retrieve exceptions (else asyncio logs "Task exception
+                    # was never retrieved" per dead peer per cycle) and evict
+                    # closed connections like broadcast does
+                    if isinstance(t.exception(), websockets.ConnectionClosed):
+                        room.drop_ws(tasks[t])
+
+        if (ENABLE_TURN_TIMER and not room.game.winner and room.game.turn in MARKS
+                and room.turn_deadline_ms is not None and now_ms() >= room.turn_deadline_ms):
             # time up: opponent wins
             winner = room.opponent_mark(room.game.turn)
             room.game.winner = winner
+            room.turn_deadline_ms = None  # consumed; don't re-fire or re-sleep on it
             if winner in MARKS:
                 room.record_game_over(winner)  # score
             await broadcast(room.everyone(), {
@@ -198,26 +397,127 @@ async def turn_timer_task():
                 "reason": "timeout",
             })
             # After game over, keep state visible
-            await room.push_state()
+            room.push_state()
+
+# ====== Message handlers ======
+# one coroutine per message type, dispatched through HANDLERS below: an
+# O(1) dict lookup per message instead of walking an if/elif chain of
+# string comparisons
+
+async def _on_join(ctx: PlayerCtx, msg: Dict[str, Any]):
+    # client may send join again with a name
+    if ctx.role in MARKS:
+        name = str(msg.get("name") or ctx.role)[:32]
+        room.rename(ctx, name)
+        room.push_state()
+    else:
+        await send_json(ctx.ws, {"type": "message", "msg": "Spectating. Names only apply to players."})
+
+async def _on_request(ctx: PlayerCtx, msg: Dict[str, Any]):
+    if msg.get("requested") in ("board", "state"):
+        room.push_state()
+    else:
+        await _on_unknown(ctx, msg)
+
+async def _on_chat(ctx: PlayerCtx, msg: Dict[str, Any]):
+    txt = str(msg.get("msg", ""))[:200]
+    if not txt:
+        return
+    author = ctx.role if ctx.role in MARKS else "spectator"
+    room.queue_chat({"type": "chat", "from": author, "name": room.player_names.get(author, author), "msg": txt})
+
+async def _on_move(ctx: PlayerCtx, msg: Dict[str, Any]):
+    row = msg.get("row")
+    col = msg.get("col")
+    if not isinstance(row, int) or not isinstance(col, int):
+        await ctx.ws.send(ERR_BAD_MOVE_COORDS)
+        return
+    await _apply_move(ctx, row, col)
 
-# ====== Heartbeat ======
-async def ping_task():
-    while True:
-        await asyncio.sleep(PING_INTERVAL)
-        targets = list(room.everyone())
-        if not targets:
-            continue
-        await asyncio.gather(*(ws.ping() for ws in targets), return_exceptions=True)
+async def _apply_move(ctx: PlayerCtx, row: int, col: int):
+    # shared by JSON moves and the binary move frame
+    if ctx.role not in MARKS:
+        await ctx.ws.send(ERR_NOT_PLAYER_MOVE)
+        return
+    result = room.game.play(row, col, ctx.role)
+    if result is MoveResult.BOARD_UPDATE:
+        # reset timer
+        room._maybe_reset_turn_deadline()
+        await broadcast(room.everyone(), {"type": "board_update", "board": room.game.board, "turn": room.game.turn, "turn_deadline_ms": room.turn_deadline_ms})
+    elif result is MoveResult.GAME_OVER:
+        winner = room.game.winner
+        room.touch()  # game.winner changed even on a draw
+        if winner in MARKS:
+            room.record_game_over(winner)
+        await broadcast(room.everyone(), {"type": "game_over", "board": room.game.board, "winner": winner})
+        room.push_state()
+    else:
+        await ctx.ws.send(MOVE_ERRORS[result])
+
+async def _on_resign(ctx: PlayerCtx, msg: Dict[str, Any]):
+    if ctx.role not in MARKS:
+        await ctx.ws.send(ERR_NOT_PLAYER_RESIGN)
+        return
+    winner = room.opponent_mark(ctx.role) or "draw"
+    room.game.winner = winner
+    room.touch()
+    if winner in MARKS:
+        room.record_game_over(winner)
+    await broadcast(room.everyone(), {"type": "game_over", "board": room.game.board, "winner": winner, "reason": "resignation"})
+    room.push_state()
+
+async def _on_restart(ctx: PlayerCtx, msg: Dict[str, Any]):
+    # restart_request and restart_accept share a body: accept is the quiet
+    # variant (no offer to the other player, no ack, spectators ignored)
+    notify = msg.get("type") == "restart_request"
+    if ctx.role not in MARKS:
+        if notify:
+            await ctx.ws.send(ERR_NOT_PLAYER_RESTART)
+        return
+    room.awaiting_restart_from.add(ctx.role)
+    other = room.opponent_mark(ctx.role)
+    if notify:
+        # notify the other player
+        other_ws = room.ws_for_mark(other) if other else None
+        if other_ws:
+            await send_json(other_ws, {"type": "restart_offer", "from": ctx.role, "name": room.name_for(ctx.role)})
+    # If both agreed OR game already finished and single request is enough
+    if (other in room.awaiting_restart_from) or (room.game.winner is not None):
+        room.start_new_game()
+        await broadcast(room.everyone(), {
+            "type": "new_game",
+            "board": room.game.board,
+            "starting_mark": room.game.turn,
+            "scores": room.scores,
+            "turn_deadline_ms": room.turn_deadline_ms,
+        })
+        room.push_state()
+    elif notify:
+        await send_json(ctx.ws, {"type": "message", "msg": "Restart request sent. Waiting for the other player."})
+
+async def _on_unknown(ctx: PlayerCtx, msg: Dict[str, Any]):
+    await send_json(ctx.ws, {"type": "error", "code": "unknown_type", "msg": f"Unknown message type: {msg.get('type')}"})
+
+HANDLERS = {
+    "join": _on_join,
+    "request": _on_request,
+    "chat": _on_chat,
+    "move": _on_move,
+    "resign": _on_resign,
+    "restart_request": _on_restart,
+    "restart_accept": _on_restart,
+}
 
 # ====== Handler ======
 async def handler(ws: WSS):
     # Assign role
-    role = room.assign_role(ws)
+    ctx = room.assign_role(ws)
+    role = ctx.role
     try:
         # Initial handshake: expect optional join {type:"join", name:"..."}
         await send_json(ws, {"type": "hello", "role": role})
         # Send full room state
-        await room.push_state()
+        room.push_state()
 
         if role == "spectator":
             await send_json(ws, {"type": "message", "msg": "You are watching as a spectator."})
@@ -227,136 +527,67 @@ async def handler(ws: WSS):
                 await send_json(ws, {"type": "message", "msg": "Waiting for the other player..."})
 
         async for text in ws:
-            try:
-                msg = json.loads(text)
-            except json.JSONDecodeError:
-                await send_json(ws, {"type": "error", "code": "bad_json", "msg": "Invalid JSON."})
+            if isinstance(text, bytes):
+                # compact binary framing for the hot path: a move is 3
+                # bytes instead of a JSON document (play() range-checks
+                # the coords). Unknown opcodes are dropped.
+                if len(text) == 3 and text[0] == OP_MOVE:
+                    await _apply_move(ctx, text[1], text[2])
                 continue
-
-            mtype = msg.get("type")
-            # --- join / rename ---
-            if mtype == "join":
-                # client may send join again with a name
-                if role in MARKS:
-                    name = str(msg.get("name") or role)[:32]
-                    room.player_names[role] = name
-                    await room.push_state()
-                else:
-                    await send_json(ws, {"type": "message", "msg": "Spectating. Names only apply to players."})
-                continue
-
-            # --- request board/state ---
-            if mtype == "request" and msg.get("requested") in ("board", "state"):
-                await room.push_state()
-                continue
-
-            # --- chat ---
-            if mtype == "chat":
-                txt = str(msg.get("msg", ""))[:200]
-                if not txt:
-                    continue
-                author = role if role in MARKS else "spectator"
-                await broadcast(room.everyone(), {"type": "chat", "from": author, "name": room.player_names.get(author, author), "msg": txt})
-                continue
-
-            # --- move ---
-            if mtype == "move":
-                if role not in MARKS:
-                    await send_json(ws, {"type": "error", "code": "not_player", "msg": "Spectators cannot move."})
-                    continue
-                row = msg.get("row")
-                col = msg.get("col")
-                if not isinstance(row, int) or not isinstance(col, int):
-                    await send_json(ws, {"type": "error", "code": "bad_coords", "msg": "row/col must be integers."})
-                    continue
-                result = room.game.play(row, col, role)
-                if result["type"] == "board_update":
-                    # reset timer
-                    room._maybe_reset_turn_deadline()
-                    await broadcast(room.everyone(), {"type": "board_update", "board": result["board"], "turn": result["turn"], "turn_deadline_ms": room.turn_deadline_ms})
-                elif result["type"] == "game_over":
-                    winner = result.get("winner")
-                    if winner in MARKS:
-                        room.record_game_over(winner)
-                    await broadcast(room.everyone(), result)
-                    await room.push_state()
-                else:
-                    await send_json(ws, result)
-                continue
-
-            # --- resign ---
-            if mtype == "resign":
-                if role not in MARKS:
-                    await send_json(ws, {"type": "error", "code": "not_player", "msg": "Spectators cannot resign."})
-                    continue
-                winner = room.opponent_mark(role) or "draw"
-                room.game.winner = winner
-                if winner in MARKS:
-                    room.record_game_over(winner)
-                await broadcast(room.everyone(), {"type": "game_over", "board": room.game.board, "winner": winner, "reason": "resignation"})
-                await room.push_state()
-                continue
-
-            # --- restart flow ---
-            if mtype == "restart_request":
-                if role not in MARKS:
-                    await send_json(ws, {"type": "error", "code": "not_player", "msg": "Only players can request restart."})
-                    continue
-                room.awaiting_restart_from.add(role)
-                # notify the other player
-                other = room.opponent_mark(role)
-                other_ws = room.ws_for_mark(other) if other else None
-                if other_ws:
-                    await send_json(other_ws, {"type": "restart_offer", "from": role, "name": room.name_for(role)})
-                # If both agreed OR game already finished and single request is enough
-                if (other in room.awaiting_restart_from) or (room.game.winner is not None):
-                    room.start_new_game()
-                    await broadcast(room.everyone(), {
-                        "type": "new_game",
-                        "board": room.game.board,
-                        "starting_mark": room.game.turn,
-                        "scores": room.scores,
-                        "turn_deadline_ms": room.turn_deadline_ms,
-                    })
-                    await room.push_state()
-                else:
-                    await send_json(ws, {"type": "message", "msg": "Restart request sent. Waiting for the other player."})
-                continue
-
-            # --- accept restart (alias) ---
-            if mtype == "restart_accept":
-                # same as sending a restart_request from that player
-                if role in MARKS:
-                    room.awaiting_restart_from.add(role)
-                    other = room.opponent_mark(role)
-                    if (other in room.awaiting_restart_from) or (room.game.winner is not None):
-                        room.start_new_game()
-                        await broadcast(room.everyone(), {
-                            "type": "new_game",
-                            "board": room.game.board,
-                            "starting_mark": room.game.turn,
-                            "scores": room.scores,
-                            "turn_deadline_ms": room.turn_deadline_ms,
-                        })
-                        await room.push_state()
+            try:
+                msg = orjson.loads(text)
+            except orjson.JSONDecodeError:
+                await ws.send(ERR_BAD_JSON)
                 continue
 
-            # --- unknown ---
-            await send_json(ws, {"type": "error", "code": "unknown_type", "msg": f"Unknown message type: {mtype}"})
+            # a "batch" frame carries several messages coalesced by the client
+            if msg.get("type") == "batch":
+                batch = [m for m in msg.get("msgs", []) if isinstance(m, dict)]
+            else:
+                batch = [msg]
+            for msg in batch:
+                handler_fn = HANDLERS.get(msg.get("type"), _on_unknown)
+                await handler_fn(ctx, msg)
     finally:
         room.drop_ws(ws)
         # Let others know someone left + refresh state
-        await room.push_state()
+        room.push_state()
 
 # ====== Server ======
+def _listen_socket() -> socket.socket:
+    # each worker binds its own socket; with SO_REUSEPORT the kernel
+    # load-balances accepted connections across them
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):  # not on Windows
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((HOST, PORT))
+    return sock
+
 async def main():
-    print(f"WebSocket server listening on ws://{HOST}:{PORT}")
-    async with websockets.serve(handler, HOST, PORT, max_size=2**20, ping_interval=None):
+    print(f"WebSocket server listening on ws://{HOST}:{PORT} (pid {os.getpid()})")
+    async with websockets.serve(handler, sock=_listen_socket(), max_size=2**20,
+                                ping_interval=None, compression=None,
+                                write_limit=2**16):
         # start background tasks
-        await asyncio.gather(turn_timer_task(), ping_task())
+        await scheduler_task()
 
-if __name__ == "__main__":
+def _run_worker():
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass  # stock asyncio works too (uvloop is not available on Windows)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         pass
+
+if __name__ == "__main__":
+    # WORKERS=N runs one event loop per process to scale past the GIL.
+    # Room state is per-process, so this suits fleets of independent
+    # rooms; the default of 1 keeps the single shared room semantics.
+    if WORKERS > 1 and hasattr(socket, "SO_REUSEPORT"):
+        for _ in range(WORKERS - 1):
+            multiprocessing.Process(target=_run_worker, daemon=True).start()
+    _run_worker()